@@ -1,28 +1,398 @@
-import random
+import os
+import shutil
+import subprocess
 from time import sleep
-from threading import Thread
-from queue import SimpleQueue, Empty
-from typing import Tuple, Any, List, Dict
+from threading import Thread, Condition
+from queue import SimpleQueue, Empty, Full
+from typing import Tuple, Any, List, Dict, Callable, Optional
 
 import cv2
 import numpy as np
 
 WINDOW_NAME = "Processed Video"
 VIDEO_PATH = "C:/Users/ism/Videos/2024-07-21 21-17-45.mp4"
+# per-channel (B, G, R, A) scalar added with saturation by the pink effect
+PINK_SHIFT = (0, 0, 100, 0)
 
 
-class Filter:
+def drawHeart(frame: np.ndarray, radius: int, color: Tuple[int, ...] = (0, 0, 255),
+              center: Optional[Tuple[int, int]] = None):
+    """
+    Draw a filled heart on the frame (in place).
+    :param frame: image to draw on.
+    :param radius: radius of the heart's upper circles.
+    :param color: fill color.
+    :param center: (x, y) of the heart, center of the frame by default.
+    :return:
+    """
+    if center is None:
+        center = (frame.shape[1] // 2, frame.shape[0] // 2)
+    center_x, center_y = center
+    cv2.circle(frame, (center_x - radius, center_y - radius), radius, color, -1)
+    cv2.circle(frame, (center_x + radius, center_y - radius), radius, color, -1)
+    center_y += 2
+    points = np.array([[center_x - 2 * radius - 2.5, center_y - radius],
+                       [center_x + 2 * radius + 2.5, center_y - radius],
+                       [center_x, center_y + radius * 2]], np.int32)
+    cv2.fillPoly(frame, [points], color)
+
+
+class HeartOverlay:
+    """
+    Red heart rasterized into a mask of its bounding box once per frame shape
+    and then put onto frames with a masked copy of that box only.
+    """
+    def __init__(self, radius: int):
+        """
+        Initialize overlay.
+        :param radius: radius of the heart's upper circles.
+        """
+        self.radius = radius
+        self.shape = None
+        self.mask = None
+        self.red = None
+        self.roi = None
+
+    def _prepare(self, shape: Tuple[int, ...]):
+        """
+        Rasterize the heart for frames of the given shape.
+        :param shape: frame shape.
+        :return:
+        """
+        self.shape = shape
+        rows, cols = shape[:2]
+        center_x, center_y = cols // 2, rows // 2
+        # the heart fits in 2 * radius around the center plus the triangle corners
+        half = 2 * self.radius + 4
+        x0, y0 = max(center_x - half, 0), max(center_y - half, 0)
+        x1, y1 = min(center_x + half, cols), min(center_y + half, rows)
+        mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        drawHeart(mask, self.radius, (255,), (center_x - x0, center_y - y0))
+
+        x, y, w, h = cv2.boundingRect(mask)
+        self.mask = mask[y:y + h, x:x + w]
+        self.red = np.full((h, w, 3), (0, 0, 255), np.uint8)
+        self.roi = (slice(y0 + y, y0 + y + h), slice(x0 + x, x0 + x + w))
+
+    def draw(self, frame: np.ndarray):
+        """
+        Put the heart onto the frame (in place).
+        :param frame: BGR frame.
+        :return:
+        """
+        if frame.shape != self.shape:
+            self._prepare(frame.shape)
+        cv2.copyTo(self.red, self.mask, dst=frame[self.roi])
+
+
+class SlotQueue:
+    """
+    Base of queues passing data through a fixed number of slots.
+    Every slot owns a reusable frame buffer, so a producer can write
+    its frame directly into the queue instead of allocating a new one.
+    Subclasses decide which slot is written and which one is read next.
+    """
+    def __init__(self, capacity: int):
+        """
+        Initialize queue.
+        :param capacity: number of slots.
+        """
+        self.capacity = capacity
+        self.slots: List[Any] = [None] * capacity
+        self.buffers: List[Optional[np.ndarray]] = [None] * capacity
+
+    def _claim(self, block: bool, timeout: Optional[float]) -> int:
+        """
+        Claim a slot for writing.
+        :return: slot index. Raises Full if no slot could be claimed.
+        """
+        raise NotImplementedError
+
+    def acquireWrite(self, shape: Tuple[int, ...], dtype: Any,
+                     timeout: Optional[float] = None) -> Tuple[int, np.ndarray]:
+        """
+        Claim the next free slot and its buffer for writing.
+        The buffer is (re)allocated only if shape or type differs.
+        :param shape: shape of the buffer.
+        :param dtype: type of the buffer.
+        :param timeout: seconds to wait for a free slot, None to wait forever.
+        :return: tuple of (slot index, buffer). Raises Full on timeout.
+        """
+        return self._buffer(self._claim(True, timeout), shape, dtype)
+
+    def _buffer(self, idx: int, shape: Tuple[int, ...], dtype: Any) -> Tuple[int, np.ndarray]:
+        """
+        Get the buffer of a slot, (re)allocated if shape or type differs.
+        :return: tuple of (slot index, buffer).
+        """
+        buf = self.buffers[idx]
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = self.buffers[idx] = np.empty(shape, dtype)
+        return idx, buf
+
+    def exchange(self, idx: int, buf: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        Replace the buffer of a slot held by the caller, which
+        allows to hand a buffer over between queues without copying.
+        :param idx: slot index.
+        :param buf: new buffer of the slot, None to allocate a new one when needed.
+        :return: previous buffer of the slot.
+        """
+        old, self.buffers[idx] = self.buffers[idx], buf
+        return old
+
+    def publish(self, idx: int):
+        """
+        Make the buffer of a slot claimed by acquireWrite visible to the consumer.
+        :param idx: slot index.
+        :return:
+        """
+        raise NotImplementedError
+
+    def abort(self, idx: int):
+        """
+        Give back a slot claimed by acquireWrite without publishing it.
+        :param idx: slot index.
+        :return:
+        """
+        raise NotImplementedError
+
+    def acquireRead(self, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """
+        Take a published slot. The slot (and its buffer)
+        is not reused by the producer until it is released.
+        :param timeout: seconds to wait for data, None to wait forever.
+        :return: tuple of (slot index, data). Raises Empty on timeout.
+        """
+        raise NotImplementedError
+
+    def release(self, idx: int):
+        """
+        Give a slot taken by acquireRead back to the producer.
+        :param idx: slot index.
+        :return:
+        """
+        raise NotImplementedError
+
+    def put(self, data: Any, block: bool = True, timeout: Optional[float] = None):
+        """
+        Put arbitrary data into the queue (as a reference, without copying).
+        :param data: any data.
+        :param block: whether to wait for a free slot.
+        :param timeout: seconds to wait, None to wait forever.
+        :return: Raises Full if no slot was free.
+        """
+        raise NotImplementedError
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        """
+        Get data from the queue and free its slot immediately.
+        :param block: whether to wait for data.
+        :param timeout: seconds to wait, None to wait forever.
+        :return: data. Raises Empty if there was none.
+        """
+        if not block:
+            timeout = 0
+        idx, data = self.acquireRead(timeout)
+        if data is self.buffers[idx]:
+            # the caller owns the returned buffer, so the slot must not reuse it
+            self.buffers[idx] = None
+        self.release(idx)
+        return data
+
+
+class RingQueue(SlotQueue):
+    """
+    Bounded queue over a ring of slots. Several producers may share it,
+    so a filter can have more than one input filter.
+    A full queue blocks the producer, which gives back-pressure.
+    Slot indices are passed through two queue.SimpleQueue (implemented in C),
+    so a hop costs no Python-level locking.
+    """
+    def __init__(self, capacity: int = 4):
+        """
+        Initialize queue.
+        :param capacity: number of slots.
+        """
+        super().__init__(capacity)
+        # indices of slots free for writing and of published slots in order
+        self.free = SimpleQueue()
+        self.ready = SimpleQueue()
+        for idx in range(capacity):
+            self.free.put(idx)
+
+    def _claim(self, block: bool, timeout: Optional[float]) -> int:
+        """
+        Claim the next free slot for writing.
+        :return: slot index.
+        """
+        try:
+            return self.free.get(block, timeout)
+        except Empty:
+            raise Full
+
+    def publish(self, idx: int):
+        """
+        Make the buffer of a slot claimed by acquireWrite visible to the consumer.
+        :param idx: slot index.
+        :return:
+        """
+        self.slots[idx] = self.buffers[idx]
+        self.ready.put(idx)
+
+    def abort(self, idx: int):
+        """
+        Give back a slot claimed by acquireWrite without publishing it.
+        :param idx: slot index.
+        :return:
+        """
+        self.free.put(idx)
+
+    def acquireRead(self, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """
+        Take the oldest published slot. The slot (and its buffer)
+        is not reused by the producer until it is released.
+        :param timeout: seconds to wait for data, None to wait forever.
+        :return: tuple of (slot index, data). Raises Empty on timeout.
+        """
+        idx = self.ready.get(True, timeout)
+        return idx, self.slots[idx]
+
+    def release(self, idx: int):
+        """
+        Give a slot taken by acquireRead back to the producer.
+        :param idx: slot index.
+        :return:
+        """
+        self.slots[idx] = None
+        self.free.put(idx)
+
+    def put(self, data: Any, block: bool = True, timeout: Optional[float] = None):
+        """
+        Put arbitrary data into the queue (as a reference, without copying).
+        :param data: any data.
+        :param block: whether to wait for a free slot.
+        :param timeout: seconds to wait, None to wait forever.
+        :return: Raises Full if no slot was free.
+        """
+        idx = self._claim(block, timeout)
+        self.slots[idx] = data
+        self.ready.put(idx)
+
+
+class LatestSlot(SlotQueue):
+    """
+    Single-consumer slot holding only the latest data.
+    The producer never waits for the consumer: publishing overwrites unread data,
+    and the consumer always gets the freshest one. Triple-buffered,
+    so the producer can write while the consumer reads.
+    """
     def __init__(self):
+        """
+        Initialize slot.
+        """
+        super().__init__(3)
+        self.changed = Condition()
+        # indices of the unread, the read and the written slot
+        self.latest = None
+        self.reading = None
+        self.writing = None
+
+    def _claim(self, block: bool, timeout: Optional[float]) -> int:
+        """
+        Claim a slot that is neither the latest nor being read.
+        Waits only while another producer is writing.
+        :return: slot index.
+        """
+        with self.changed:
+            if not block:
+                timeout = 0
+            if not self.changed.wait_for(lambda: self.writing is None, timeout):
+                raise Full
+            self.writing = next(i for i in range(self.capacity) if i != self.latest and i != self.reading)
+            return self.writing
+
+    def publish(self, idx: int):
+        """
+        Make the buffer of a slot claimed by acquireWrite the latest data,
+        dropping the previous one if it was not read.
+        :param idx: slot index.
+        :return:
+        """
+        self._set(idx, self.buffers[idx])
+
+    def _set(self, idx: int, data: Any):
+        """
+        Make data in the slot the latest.
+        :return:
+        """
+        with self.changed:
+            if self.latest is not None:
+                self.slots[self.latest] = None
+            self.slots[idx] = data
+            self.latest = idx
+            self.writing = None
+            self.changed.notify_all()
+
+    def abort(self, idx: int):
+        """
+        Give back a slot claimed by acquireWrite without publishing it.
+        :param idx: slot index.
+        :return:
+        """
+        with self.changed:
+            self.writing = None
+            self.changed.notify_all()
+
+    def acquireRead(self, timeout: Optional[float] = None) -> Tuple[int, Any]:
+        """
+        Take the latest data. The slot is not reused by the producer until it is released.
+        :param timeout: seconds to wait for data, None to wait forever.
+        :return: tuple of (slot index, data). Raises Empty on timeout.
+        """
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.latest is not None, timeout):
+                raise Empty
+            idx, self.latest = self.latest, None
+            self.reading = idx
+            return idx, self.slots[idx]
+
+    def release(self, idx: int):
+        """
+        Give a slot taken by acquireRead back to the producer.
+        :param idx: slot index.
+        :return:
+        """
+        with self.changed:
+            self.slots[idx] = None
+            self.reading = None
+
+    def put(self, data: Any, block: bool = True, timeout: Optional[float] = None):
+        """
+        Put arbitrary data into the slot, replacing unread data.
+        :param data: any data.
+        :param block: whether to wait for another producer to finish writing.
+        :param timeout: seconds to wait, None to wait forever.
+        :return:
+        """
+        self._set(self._claim(block, timeout), data)
+
+
+class Filter:
+    def __init__(self, input: Optional[SlotQueue] = None):
         """
         Initialize filter.
+        :param input: input queue, a new RingQueue by default.
         """
-        self.input = SimpleQueue()
+        self.input = RingQueue() if input is None else input
         self.outputs = []
         self.thread = None
+        # index of the input slot being processed
+        self.held = None
         # simple boolean is not harmful in this threading scenario
         self.should_stop = False
 
-    def setOutputs(self, outputs: List[SimpleQueue[Any]]):
+    def setOutputs(self, outputs: List[SlotQueue]):
         """
         Set output queues.
         :param outputs: list of queues.
@@ -30,22 +400,27 @@ class Filter:
         """
         self.outputs = outputs
 
-    def start(self):
+    def start(self, threaded: bool = True):
         """
         Start filter process. Cannot be called while already running.
+        :param threaded: whether to run the filter in its own thread,
+        otherwise it is driven by calling step.
         :return:
         """
         self.should_stop = False
         if self.thread is not None and self.thread.is_alive():
             raise Exception("The filter is already running!")
-        self.thread = Thread(target=self._runner)
-        self.thread.start()
+        if threaded:
+            self.thread = Thread(target=self._runner)
+            self.thread.start()
 
     def isRunning(self) -> bool:
         """
         Check if filter is running.
         :return: True or False.
         """
+        if self.thread is None:
+            return not self.should_stop
         return self.thread.is_alive()
 
     def stop(self):
@@ -66,14 +441,61 @@ class Filter:
         """
         while not self.should_stop:
             try:
-                data = self.input.get(block=True, timeout=0.1)
+                running = self.step(0.1)
             except Empty:
                 continue
 
-            if not self.process(data):
+            if not running:
                 self.should_stop = True
                 break
 
+    def step(self, timeout: float = 0) -> bool:
+        """
+        Process one piece of input data.
+        :param timeout: seconds to wait for input data.
+        :return: Bool whether a filter should continue running.
+        Raises Empty if there was no data.
+        """
+        idx, data = self.input.acquireRead(timeout=timeout)
+
+        # the slot is held while processing, so its buffer cannot be overwritten
+        self.held = idx
+        running = self.process(data)
+        self.held = None
+        self.input.release(idx)
+        return running
+
+    def _acquireWrite(self, output: SlotQueue, shape: Tuple[int, ...],
+                      dtype: Any) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Wait for a free slot of the output queue while the filter is running.
+        :param output: output queue.
+        :param shape: shape of the frame to write.
+        :param dtype: type of the frame to write.
+        :return: tuple of (slot index, buffer) or None if the filter was stopped.
+        """
+        while True:
+            try:
+                return output.acquireWrite(shape, dtype, timeout=0.1)
+            except Full:
+                if self.should_stop:
+                    return None
+
+    def _put(self, output: SlotQueue, data: Any) -> bool:
+        """
+        Put data into the output queue, waiting for a free slot while the filter is running.
+        :param output: output queue.
+        :param data: Any data.
+        :return: False if the filter was stopped before data was put.
+        """
+        while True:
+            try:
+                output.put(data, timeout=0.1)
+                return True
+            except Full:
+                if self.should_stop:
+                    return False
+
     def process(self, data: Any) -> bool:
         """
         Base process function that passes data onto next filter.
@@ -81,8 +503,82 @@ class Filter:
         :param data: Any data to process.
         :return: Bool whether a filter should continue running.
         """
+        if self.held is not None and data is self.input.buffers[self.held]:
+            # the buffer is passed on by reference, so the input slot must not reuse it
+            self.input.exchange(self.held, None)
         for output in self.outputs:
-            output.put(data)
+            if not self._put(output, data):
+                return False
+        return True
+
+
+class FrameFilter(Filter):
+    """
+    Base of filters mapping a frame onto a new frame of the same shape and type.
+    The result is written directly into a slot of the output queue.
+    """
+    # whether apply works with dst being the frame itself; then with a single output
+    # a frame published into the input slot buffer is modified in place
+    # and handed over downstream instead of copied
+    inplace = False
+
+    def apply(self, frame: np.ndarray, dst: np.ndarray):
+        """
+        Apply the effect. Must be implemented by derived filters.
+        :param frame: input frame, must not be modified unless it is dst.
+        :param dst: preallocated output frame.
+        :return:
+        """
+        raise NotImplementedError
+
+    def step(self, timeout: float = 0) -> bool:
+        """
+        Process one frame, in place if the filter supports it.
+        :param timeout: seconds to wait for a frame.
+        :return: Bool whether a filter should continue running.
+        Raises Empty if there was no frame.
+        """
+        if not self.inplace or len(self.outputs) != 1:
+            return super().step(timeout)
+        src_idx, frame = self.input.acquireRead(timeout=timeout)
+
+        if frame is not self.input.buffers[src_idx]:
+            # data passed by put() may be shared with other consumers, so it is not modified
+            running = self.process(frame)
+            self.input.release(src_idx)
+            return running
+
+        output = self.outputs[0]
+        slot = self._acquireWrite(output, frame.shape, frame.dtype)
+        if slot is None:
+            self.input.release(src_idx)
+            return False
+        idx, _ = slot
+        self.apply(frame, frame)
+        # swap buffers: the frame goes downstream, the free output buffer comes to the input
+        self.input.exchange(src_idx, output.exchange(idx, frame))
+        output.publish(idx)
+        self.input.release(src_idx)
+        return True
+
+    def process(self, frame: np.ndarray) -> bool:
+        """
+        Apply the effect into a slot of every output queue.
+        :param frame: frame to process.
+        :return: Bool whether a filter should continue running.
+        """
+        result = None
+        for output in self.outputs:
+            slot = self._acquireWrite(output, frame.shape, frame.dtype)
+            if slot is None:
+                return False
+            idx, dst = slot
+            if result is None:
+                self.apply(frame, dst)
+                result = dst
+            else:
+                np.copyto(dst, result)
+            output.publish(idx)
         return True
 
 
@@ -101,13 +597,18 @@ class Pipeline:
         """
         self.pipeline = pipeline
         self.outputs = {}
+        connected = set()
         for f, out in self.pipeline.values():
-            outputs: List[SimpleQueue[Any]|None] = [None] * len(out)
+            outputs: List[Optional[SlotQueue]] = [None] * len(out)
             for i, el in enumerate(out):
                 if el not in self.pipeline:
-                    self.outputs[el] = SimpleQueue()
+                    self.outputs[el] = RingQueue()
                     outputs[i] = self.outputs[el]
                 else:
+                    # a LatestSlot drops unread data, so it takes a single input filter
+                    if el in connected and isinstance(self.pipeline[el][0].input, LatestSlot):
+                        raise Exception(f"The filter '{el}' already has an input filter!")
+                    connected.add(el)
                     outputs[i] = self.pipeline[el][0].input
             f.setOutputs(outputs)
 
@@ -119,6 +620,53 @@ class Pipeline:
         for f, _ in self.pipeline.values():
             f.start()
 
+    def _order(self) -> List[Filter]:
+        """
+        Order filters by the flow of data (edges closing a cycle are ignored).
+        :return: list of filters.
+        """
+        order = []
+        visited = set()
+
+        def visit(name: str):
+            if name in visited or name not in self.pipeline:
+                return
+            visited.add(name)
+            for el in self.pipeline[name][1]:
+                visit(el)
+            order.append(self.pipeline[name][0])
+
+        for name in self.pipeline:
+            visit(name)
+        return order[::-1]
+
+    def runSequential(self):
+        """
+        Run pipeline in the calling thread instead of a thread per filter:
+        filters are stepped one after another in the order of data flow,
+        so a chain passes a frame through all of its filters in one round.
+        Outputs accessed by getSource must be read from another thread.
+        Returns when any of the filters stops.
+        :return:
+        """
+        order = self._order()
+        for f in order:
+            f.start(threaded=False)
+        while True:
+            idle = True
+            for f in order:
+                try:
+                    running = f.step()
+                except Empty:
+                    continue
+                idle = False
+                if not running:
+                    f.should_stop = True
+                    return
+            if idle:
+                # nothing to process in the whole round, back off instead of spinning
+                sleep(0.001)
+
     def isRunning(self, fil: str) -> bool:
         """
         Check if pipeline is running.
@@ -135,7 +683,7 @@ class Pipeline:
         for f, _ in self.pipeline.values():
             f.stop()
 
-    def getSource(self, key: str) -> SimpleQueue[Any]:
+    def getSource(self, key: str) -> RingQueue:
         """
         Get predefined (by unique outputs) source by name.
         :param key: name of the output.
@@ -143,7 +691,7 @@ class Pipeline:
         """
         return self.outputs[key]
 
-    def getSink(self, fil: str) -> SimpleQueue[Any]:
+    def getSink(self, fil: str) -> SlotQueue:
         """
         Get input queue of the filter.
         :param fil: filter name.
@@ -152,109 +700,371 @@ class Pipeline:
         return self.pipeline[fil][0].input
 
 
-class PinkFilter(Filter):
+class PinkFilter(FrameFilter):
     def __init__(self):
         super().__init__()
 
-    def process(self, frame):
-        pink_frame = frame.copy()
-        pink_frame[:, :, 2] = np.minimum(frame[:, :, 2] + 100, 255)
-        return super().process(pink_frame)
+    def apply(self, frame, dst):
+        # saturating uint8 add, copies the other channels in the same pass
+        cv2.add(frame, PINK_SHIFT, dst=dst)
 
 
-class ShakingFilter(Filter):
-    def __init__(self):
+class ShakingFilter(FrameFilter):
+    max_shift = 10
+    # number of shifts drawn from the generator at once
+    batch = 4096
+
+    def __init__(self, mirror: bool = False, seed: Optional[int] = None):
+        """
+        Initialize filter.
+        :param mirror: also flip frames horizontally (in the same pass),
+        replacing a MirrorEffectFilter placed before this one.
+        :param seed: seed of random shifts, for reproducible shaking.
+        """
+        self.mirror = mirror
+        self.rng = np.random.default_rng(seed)
+        self.shifts = []
+        self.shift_idx = 0
         super().__init__()
 
-    def process(self, frame):
+    def _nextShift(self) -> Tuple[int, int]:
+        """
+        Get the next random shift, drawing a new batch when the current one is used up.
+        :return: tuple of (dx, dy).
+        """
+        if self.shift_idx == len(self.shifts):
+            self.shifts = self.rng.integers(-self.max_shift, self.max_shift + 1,
+                                            size=(self.batch, 2)).tolist()
+            self.shift_idx = 0
+        dx, dy = self.shifts[self.shift_idx]
+        self.shift_idx += 1
+        return dx, dy
+
+    def apply(self, frame, dst):
         rows, cols, _ = frame.shape
-        shake_frame = frame.copy()
-        max_shift = 10
-        dx = random.randint(-max_shift, max_shift)
-        dy = random.randint(-max_shift, max_shift)
+        dx, dy = self._nextShift()
 
-        M = np.float32([[1, 0, dx], [0, 1, dy]])
-        shake_frame = cv2.warpAffine(shake_frame, M, (cols, rows))
-        return super().process(shake_frame)
+        # with integer shifts the warp is a copy of the overlapping rectangle,
+        # which is much cheaper than a general cv2.warpAffine
+        h, w = rows - abs(dy), cols - abs(dx)
+        if h <= 0 or w <= 0:
+            dst[:] = 0
+            return
+        dst_y, dst_x = max(dy, 0), max(dx, 0)
+        src_y = max(-dy, 0)
+        if self.mirror:
+            # horizontal flip followed by translation: x' = cols - 1 - x + dx
+            src_x = cols - dst_x - w + dx
+            cv2.flip(frame[src_y:src_y + h, src_x:src_x + w], 1,
+                     dst=dst[dst_y:dst_y + h, dst_x:dst_x + w])
+        else:
+            src_x = max(-dx, 0)
+            np.copyto(dst[dst_y:dst_y + h, dst_x:dst_x + w], frame[src_y:src_y + h, src_x:src_x + w])
+        # the area left uncovered is black, same as the constant border of warpAffine
+        dst[:dst_y] = 0
+        dst[dst_y + h:] = 0
+        dst[dst_y:dst_y + h, :dst_x] = 0
+        dst[dst_y:dst_y + h, dst_x + w:] = 0
 
 
-class HeartEffectFilter(Filter):
+class HeartEffectFilter(FrameFilter):
+    inplace = True
+
     def __init__(self):
+        self.heart = HeartOverlay(40)
         super().__init__()
 
-    def process(self, frame):
-        heart_frame = frame.copy()
-        center_x, center_y = frame.shape[1] // 2, frame.shape[0] // 2
-        radius = 40
-        cv2.circle(heart_frame, (center_x - radius, center_y - radius), radius, (0, 0, 255), -1)
-        cv2.circle(heart_frame, (center_x + radius, center_y - radius), radius, (0, 0, 255), -1)
-        center_y += 2
-        points = np.array([[center_x - 2 * radius - 2.5, center_y - radius],
-                           [center_x + 2 * radius + 2.5, center_y - radius],
-                           [center_x, center_y + radius * 2]], np.int32)
-        cv2.fillPoly(heart_frame, [points], (0, 0, 255))
-
-        return super().process(heart_frame)
+    def apply(self, frame, dst):
+        if dst is not frame:
+            np.copyto(dst, frame)
+        self.heart.draw(dst)
 
 
-class MirrorEffectFilter(Filter):
+class MirrorEffectFilter(FrameFilter):
     def __init__(self):
         super().__init__()
 
-    def process(self, frame):
-        mirrored_frame = cv2.flip(frame, 1)
-        return super().process(mirrored_frame)
+    def apply(self, frame, dst):
+        cv2.flip(frame, 1, dst=dst)
+
+
+class FusedEffectsFilter(ShakingFilter):
+    """
+    Mirror, shaking, pink and heart effects in a single filter.
+    Mirror and shaking are composed into one pass writing
+    the output frame, the rest is applied to it in place.
+    """
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initialize filter.
+        :param seed: seed of random shifts, for reproducible shaking.
+        """
+        self.heart = HeartOverlay(40)
+        super().__init__(mirror=True, seed=seed)
+
+    def apply(self, frame, dst):
+        super().apply(frame, dst)
+        cv2.add(dst, PINK_SHIFT, dst=dst)
+        self.heart.draw(dst)
 
 
 class DisplayFilter(Filter):
     def __init__(self, win_name):
         self.win_name = win_name
-        super().__init__()
+        # only the freshest frame is worth showing, older ones are dropped
+        super().__init__(LatestSlot())
 
     def process(self, frame):
         cv2.imshow(self.win_name, frame)
-        cv2.waitKey(1)
+        # unlike waitKey(1), only processes pending window events without sleeping
+        cv2.pollKey()
         if not cv2.getWindowProperty(self.win_name, cv2.WND_PROP_VISIBLE):
             return False
         # probably can send some metadata/window size to then pass it to VideoSource
         return super().process(1)
 
 
+class FFmpegCapture:
+    """
+    Video reader with the interface of cv2.VideoCapture (read, release, isOpened)
+    decoding with an ffmpeg process. Frames come through the pipe as raw yuv420p,
+    half the size of bgr24, and are converted to BGR by OpenCV into the given image.
+    """
+    def __init__(self, path: str, binary: str = "ffmpeg"):
+        """
+        Initialize capture.
+        :param path: path to the video.
+        :param binary: ffmpeg executable.
+        """
+        self.proc = None
+        probe = cv2.VideoCapture(path)
+        if not probe.isOpened():
+            return
+        self.width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        probe.release()
+
+        # yuv420p needs even dimensions, otherwise ffmpeg converts to bgr24 itself
+        self.yuv = None
+        pix_fmt = "bgr24"
+        if self.width % 2 == 0 and self.height % 2 == 0:
+            self.yuv = np.empty((self.height * 3 // 2, self.width), np.uint8)
+            pix_fmt = "yuv420p"
+        # ffmpeg must not read keys from the console, e.g. 'q' would end the video
+        self.proc = subprocess.Popen([binary, "-nostdin", "-v", "error", "-i", path,
+                                      "-f", "rawvideo", "-pix_fmt", pix_fmt, "-"],
+                                     stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        """
+        Check if the video is being decoded.
+        :return: True or False.
+        """
+        return self.proc is not None
+
+    def _readInto(self, buf: np.ndarray) -> bool:
+        """
+        Fill the buffer with bytes of the next frame.
+        :param buf: contiguous buffer of exactly one frame.
+        :return: False at the end of the video.
+        """
+        view = memoryview(buf.reshape(-1))
+        filled = 0
+        while filled < len(view):
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Decode the next frame.
+        :param image: frame to decode into, reused if it has the right shape.
+        :return: tuple of (success, BGR frame).
+        """
+        if self.proc is None:
+            return False, None
+        if self.yuv is None:
+            if image is None or image.shape != (self.height, self.width, 3) or image.dtype != np.uint8:
+                image = np.empty((self.height, self.width, 3), np.uint8)
+            return self._readInto(image), image
+        if not self._readInto(self.yuv):
+            return False, None
+        return True, cv2.cvtColor(self.yuv, cv2.COLOR_YUV2BGR_I420, dst=image)
+
+    def release(self):
+        """
+        Stop decoding.
+        :return:
+        """
+        if self.proc is None:
+            return
+        self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+        self.proc = None
+
+
 class VideoSource(Filter):
-    def __init__(self, path):
-        self.cap = cv2.VideoCapture(path)
+    def __init__(self, path, capture: Callable[[str], Any] = cv2.VideoCapture):
+        """
+        Initialize filter.
+        :param path: path to the video.
+        :param capture: reader type with the interface of cv2.VideoCapture, e.g. FFmpegCapture.
+        """
+        self.cap = capture(path)
+        # shape and type of decoded frames, known after the first frame
+        self.frame_shape = None
+        self.frame_dtype = None
         super().__init__()
 
     def process(self, enabled):
         if not enabled:
             self.cap.release()
             return False
-        ret, frame = self.cap.read()
+        if self.frame_shape is None or len(self.outputs) != 1:
+            ret, frame = self.cap.read()
+            if not ret:
+                self.cap.release()
+                return False
+            self.frame_shape, self.frame_dtype = frame.shape, frame.dtype
+            return super().process(frame)
+
+        # decode straight into the output slot instead of allocating a frame
+        output = self.outputs[0]
+        slot = self._acquireWrite(output, self.frame_shape, self.frame_dtype)
+        if slot is None:
+            return False
+        idx, dst = slot
+        ret, frame = self.cap.read(dst)
         if not ret:
+            output.abort(idx)
+            self.cap.release()
+            return False
+        if frame is not dst:
+            # frame size has changed, the slot buffer does not fit anymore
+            output.abort(idx)
+            self.frame_shape, self.frame_dtype = frame.shape, frame.dtype
+            return super().process(frame)
+        output.publish(idx)
+        return True
+
+
+class AsyncVideoSource(VideoSource):
+    """
+    Video source decoding ahead in its own thread, so that the pipeline
+    does not wait for disk and decoder when asking for a frame.
+    Decoded frames are handed over to the output queue without copying.
+    """
+    def __init__(self, path, capacity: int = 4, capture: Callable[[str], Any] = cv2.VideoCapture):
+        super().__init__(path, capture)
+        self.decoded = RingQueue(capacity)
+        self.decoder = None
+
+    def start(self, threaded: bool = True):
+        """
+        Start filter and decoder threads.
+        :param threaded: whether to run the filter in its own thread,
+        the decoder always gets one.
+        :return:
+        """
+        super().start(threaded)
+        # a daemon thread cannot keep the process alive if stop is never called
+        self.decoder = Thread(target=self._decoder, daemon=True)
+        self.decoder.start()
+
+    def stop(self):
+        """
+        Stop filter and decoder threads.
+        :return:
+        """
+        super().stop()
+        if self.decoder is not None:
+            self.decoder.join()
+        self.decoder = None
+
+    def _decoder(self):
+        """
+        Function which runs in the decoder thread and fills the queue of decoded frames.
+        The end of the video is marked with None.
+        :return:
+        """
+        try:
+            ret, frame = self.cap.read()
+            if ret:
+                # the first frame gives shape of the slot buffers
+                ret = self._put(self.decoded, frame)
+            while ret:
+                slot = self._acquireWrite(self.decoded, frame.shape, frame.dtype)
+                if slot is None:
+                    return
+                idx, dst = slot
+                ret, frame = self.cap.read(dst)
+                if not ret:
+                    self.decoded.abort(idx)
+                elif frame is not dst:
+                    self.decoded.abort(idx)
+                    ret = self._put(self.decoded, frame)
+                else:
+                    self.decoded.publish(idx)
+            self._put(self.decoded, None)
+        finally:
             self.cap.release()
+
+    def process(self, enabled):
+        if not enabled:
+            return False
+        while True:
+            try:
+                src_idx, frame = self.decoded.acquireRead(timeout=0.1)
+                break
+            except Empty:
+                if self.should_stop:
+                    return False
+        if frame is None:
+            self.decoded.release(src_idx)
             return False
-        return super().process(frame)
+        if len(self.outputs) != 1:
+            running = Filter.process(self, frame.copy())
+            self.decoded.release(src_idx)
+            return running
+
+        output = self.outputs[0]
+        slot = self._acquireWrite(output, frame.shape, frame.dtype)
+        if slot is None:
+            self.decoded.release(src_idx)
+            return False
+        idx, dst = slot
+        # swap buffers: the decoded frame goes downstream, the free buffer gets decoded into
+        self.decoded.exchange(src_idx, output.exchange(idx, frame))
+        output.publish(idx)
+        self.decoded.release(src_idx)
+        return True
 
 
 def main():
+    # OpenCV may be left single-threaded or unoptimized by other libraries' settings
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(os.cpu_count() or 1)
+
+    # piping raw yuv420p from ffmpeg is faster than decoding with cv2.VideoCapture
+    capture = FFmpegCapture if shutil.which("ffmpeg") else cv2.VideoCapture
+
     pipeline = Pipeline({
-        'video': (VideoSource(VIDEO_PATH), ['mirror']),
-        'mirror': (MirrorEffectFilter(), ['shaking']),
-        'heart_effect': (HeartEffectFilter(), ['pink']),
-        'pink': (PinkFilter(), []),
-        'shaking': (ShakingFilter(), ['display']),
+        'video': (AsyncVideoSource(VIDEO_PATH, capture=capture), ['fused']),
+        'fused': (FusedEffectsFilter(), ['display']),
         'display': (DisplayFilter(WINDOW_NAME), ['video']),
     })
-    pipeline.start()
-
     enabled_sink = pipeline.getSink('video')
     enabled_sink.put(True)
 
-    while pipeline.isRunning('display') and pipeline.isRunning('video'):
-        sleep(0.1)
-
-    pipeline.stop()
-    cv2.destroyAllWindows()
+    # the pipeline is a single chain, so it runs in this thread
+    try:
+        pipeline.runSequential()
+    finally:
+        pipeline.stop()
+        cv2.destroyAllWindows()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,241 @@
+import unittest
+from queue import Empty, Full
+
+import cv2
+import numpy as np
+
+from main import drawHeart, HeartOverlay, LatestSlot, Pipeline, Filter, DisplayFilter, VideoSource, AsyncVideoSource, HeartEffectFilter, PinkFilter, ShakingFilter
+
+
+class FakeCapture:
+    """
+    Capture with the interface of cv2.VideoCapture producing a few gray frames.
+    """
+    def __init__(self, path, count=3):
+        self.left = count
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.left == 0:
+            return False, None
+        self.left -= 1
+        if image is None or image.shape != (240, 320, 3):
+            image = np.empty((240, 320, 3), np.uint8)
+        image[:] = 100
+        return True, image
+
+    def release(self):
+        self.left = 0
+
+
+class CountingCapture(FakeCapture):
+    """
+    Fake capture filling frame i with value i.
+    """
+    def __init__(self, path, count=10):
+        super().__init__(path, count)
+        self.count = count
+
+    def read(self, image=None):
+        value = self.count - self.left
+        ret, image = super().read(image)
+        if ret:
+            image[:] = value
+        return ret, image
+
+
+class TestLatestSlot(unittest.TestCase):
+    def test_drops_oldest(self):
+        slot = LatestSlot()
+        for value in range(5):
+            slot.put(value, block=False)
+        self.assertEqual(slot.get(block=False), 4)
+        with self.assertRaises(Empty):
+            slot.get(block=False)
+
+    def test_triple_buffer(self):
+        slot = LatestSlot()
+        idx, buf = slot.acquireWrite((2, 2), np.uint8)
+        buf[:] = 1
+        slot.publish(idx)
+        read_idx, frame = slot.acquireRead(timeout=0)
+        # the producer can publish while the consumer still reads
+        buffers = [frame]
+        for value in (2, 3):
+            idx, buf = slot.acquireWrite((2, 2), np.uint8, timeout=0)
+            buf[:] = value
+            slot.publish(idx)
+            buffers.append(buf)
+        self.assertEqual(len({id(b) for b in buffers}), 3)
+        # the next write reuses the buffer of the dropped data, not the one being read
+        idx, buf = slot.acquireWrite((2, 2), np.uint8, timeout=0)
+        self.assertIs(buf, buffers[1])
+        buf[:] = 4
+        slot.publish(idx)
+        np.testing.assert_array_equal(frame, 1)
+        slot.release(read_idx)
+        idx, frame = slot.acquireRead(timeout=0)
+        np.testing.assert_array_equal(frame, 4)
+        slot.release(idx)
+
+    def test_claimed_slot_is_reserved(self):
+        slot = LatestSlot()
+        idx, buf = slot.acquireWrite((2, 2), np.uint8)
+        with self.assertRaises(Full):
+            slot.put('other', block=False)
+        with self.assertRaises(Full):
+            slot.acquireWrite((2, 2), np.uint8, timeout=0.01)
+        slot.abort(idx)
+        slot.put('other', block=False)
+        self.assertEqual(slot.get(block=False), 'other')
+
+
+class TestBufferOwnership(unittest.TestCase):
+    def test_forwarded_buffer_is_not_reused(self):
+        pipeline = Pipeline({
+            'video': (VideoSource('', capture=CountingCapture), ['pink']),
+            'pink': (PinkFilter(), ['tee']),
+            'tee': (Filter(), ['out']),
+        })
+        pipeline.start()
+        try:
+            sink, out = pipeline.getSink('video'), pipeline.getSource('out')
+            for _ in range(10):
+                sink.put(True)
+            # the consumer lags behind, so upstream slots are refilled meanwhile
+            values = []
+            for _ in range(10):
+                idx, frame = out.acquireRead(timeout=2)
+                values.append(int(frame[0, 0, 0]))
+                out.release(idx)
+            self.assertEqual(values, list(range(10)))
+        finally:
+            pipeline.stop()
+
+    def test_get_returns_owned_buffer(self):
+        pipeline = Pipeline({
+            'video': (VideoSource('', capture=CountingCapture), ['pink']),
+            'pink': (PinkFilter(), ['out']),
+        })
+        pipeline.start()
+        try:
+            sink, out = pipeline.getSink('video'), pipeline.getSource('out')
+            for _ in range(8):
+                sink.put(True)
+            frames = [out.get(timeout=2) for _ in range(8)]
+            self.assertEqual([int(f[0, 0, 0]) for f in frames], list(range(8)))
+            self.assertEqual(len({id(f) for f in frames}), 8)
+        finally:
+            pipeline.stop()
+
+
+class TestFanIn(unittest.TestCase):
+    def test_two_sources_share_a_queue(self):
+        pipeline = Pipeline({
+            'a': (VideoSource('', capture=CountingCapture), ['tee']),
+            'b': (VideoSource('', capture=CountingCapture), ['tee']),
+            'tee': (Filter(), ['out']),
+        })
+        pipeline.start()
+        try:
+            for name in ('a', 'b'):
+                sink = pipeline.getSink(name)
+                for _ in range(5):
+                    sink.put(True)
+            out = pipeline.getSource('out')
+            values = sorted(int(out.get(timeout=2)[0, 0, 0]) for _ in range(10))
+            self.assertEqual(values, sorted(list(range(5)) * 2))
+        finally:
+            pipeline.stop()
+
+    def test_latest_slot_takes_one_input(self):
+        with self.assertRaises(Exception):
+            Pipeline({
+                'a': (PinkFilter(), ['display']),
+                'b': (PinkFilter(), ['display']),
+                'display': (DisplayFilter('test'), []),
+            })
+
+
+class TestInplaceFanOut(unittest.TestCase):
+    def check(self, source):
+        pipeline = Pipeline({
+            'video': (source, ['heart', 'raw']),
+            'heart': (HeartEffectFilter(), ['out']),
+        })
+        pipeline.start()
+        try:
+            sink, raw, out = pipeline.getSink('video'), pipeline.getSource('raw'), pipeline.getSource('out')
+            for _ in range(3):
+                sink.put(True)
+                idx, frame = out.acquireRead(timeout=2)
+                self.assertTrue((frame[120, 160] == (0, 0, 255)).all())
+                out.release(idx)
+                idx, frame = raw.acquireRead(timeout=2)
+                # the heart must not be drawn on the frame shared with the other branch
+                self.assertTrue((frame == 100).all())
+                raw.release(idx)
+        finally:
+            pipeline.stop()
+
+    def test_video_source(self):
+        self.check(VideoSource('', capture=FakeCapture))
+
+    def test_async_video_source(self):
+        self.check(AsyncVideoSource('', capture=FakeCapture))
+
+
+class TestShakingFilter(unittest.TestCase):
+    # frames smaller than the maximal shift get fully shifted out
+    shapes = [(240, 320, 3), (100, 90, 3), (5, 30, 3), (15, 12, 3), (1, 1, 3)]
+
+    def check(self, mirror):
+        seed = 7
+        shifts = np.random.default_rng(seed).integers(
+            -ShakingFilter.max_shift, ShakingFilter.max_shift + 1, size=(ShakingFilter.batch, 2)).tolist()
+        rng = np.random.default_rng(0)
+        fil = ShakingFilter(mirror=mirror, seed=seed)
+        for i in range(300):
+            rows, cols, ch = self.shapes[i % len(self.shapes)]
+            frame = rng.integers(0, 256, size=(rows, cols, ch), dtype=np.uint8)
+            dst = np.full_like(frame, 255)
+            fil.apply(frame, dst)
+
+            dx, dy = shifts[i]
+            M = np.float32([[1, 0, dx], [0, 1, dy]])
+            expected = cv2.warpAffine(cv2.flip(frame, 1) if mirror else frame, M, (cols, rows))
+            np.testing.assert_array_equal(dst, expected, err_msg=f'shape {frame.shape}, shift {(dx, dy)}')
+
+    def test_shake(self):
+        self.check(mirror=False)
+
+    def test_mirror_shake(self):
+        self.check(mirror=True)
+
+
+class TestHeartOverlay(unittest.TestCase):
+    # the heart is clipped by frames smaller than its size
+    shapes = [(240, 320, 3), (1080, 1920, 3), (241, 321, 3), (100, 90, 3), (30, 500, 3), (1, 1, 3)]
+
+    def test_matches_drawHeart(self):
+        rng = np.random.default_rng(0)
+        overlay = HeartOverlay(40)
+        fil = HeartEffectFilter()
+        for shape in self.shapes + self.shapes:
+            frame = rng.integers(0, 256, size=shape, dtype=np.uint8)
+            expected = frame.copy()
+            drawHeart(expected, 40)
+
+            drawn = frame.copy()
+            overlay.draw(drawn)
+            np.testing.assert_array_equal(drawn, expected, err_msg=f'shape {shape}')
+
+            dst = np.empty_like(frame)
+            fil.apply(frame, dst)
+            np.testing.assert_array_equal(dst, expected, err_msg=f'shape {shape}')
+
+
+if __name__ == '__main__':
+    unittest.main()